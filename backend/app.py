@@ -1,10 +1,13 @@
 from fastapi import FastAPI, HTTPException, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
+from contextlib import asynccontextmanager
 import uvicorn
+import orjson
 import os
 from dotenv import load_dotenv
 
@@ -14,11 +17,41 @@ from orchestrator import SearchOrchestrator
 # Load environment variables
 load_dotenv()
 
+class SelectiveGZipMiddleware:
+    """
+    GZipMiddleware with an exclusion list for streaming paths.
+
+    Starlette's GZip ignores minimum_size for streamed bodies and zlib
+    buffers small writes, so compressing the NDJSON token stream would
+    hold each token line back until a compressed block fills. Excluded
+    paths bypass compression entirely; everything else (static files,
+    cached JSON responses) is compressed as before.
+    """
+
+    def __init__(self, app, exclude_paths=(), **kwargs):
+        self.app = app
+        self.gzip = GZipMiddleware(app, **kwargs)
+        self.exclude_paths = set(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+        else:
+            await self.gzip(scope, receive, send)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Close pooled HTTP connections on shutdown
+    await orchestrator.aclose()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="AI Search Engine API",
     description="Backend for Perplexity-like AI Search Engine",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS
@@ -30,6 +63,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large JSON bodies (extracted content and cached answers are
+# tens of KB of text); the /search NDJSON stream is excluded so token
+# lines flush to the client immediately instead of sitting in zlib's
+# buffer until a compressed block fills
+app.add_middleware(
+    SelectiveGZipMiddleware,
+    exclude_paths=("/search",),
+    minimum_size=1024,
+    compresslevel=5
+)
+
 # Initialize Orchestrator
 orchestrator = SearchOrchestrator(
     cache_dir=os.getenv("CACHE_DIR", "./cache"),
@@ -60,13 +104,22 @@ class SearchRequest(BaseModel):
 @app.post("/search")
 async def search(request: SearchRequest):
     """
-    Perform a search query.
+    Perform a search query, streamed as NDJSON.
+
+    Each line is one pipeline event (status, sources, suggestions, raw
+    token frame, complete), so clients render tokens as they arrive
+    instead of waiting for the full answer to be generated.
     """
-    try:
-        result = orchestrator.search(request.query, request.use_cache, request.provider)
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    async def ndjson_stream():
+        async for chunk in orchestrator.search_stream(
+            request.query, request.use_cache, request.provider
+        ):
+            if isinstance(chunk, bytes):
+                yield chunk + b"\n"
+            else:
+                yield orjson.dumps(chunk) + b"\n"
+
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
 
 @app.get("/health")
 async def health_check():
@@ -84,12 +137,19 @@ async def websocket_endpoint(websocket: WebSocket):
             provider = data.get("provider", "all")
             
             if not query:
-                await websocket.send_json({"error": "Query is required"})
+                await websocket.send_bytes(orjson.dumps({"error": "Query is required"}))
                 continue
-            
-            # Stream results
-            for chunk in orchestrator.search_stream(query, use_cache, provider):
-                await websocket.send_json(chunk)
+
+            # Stream results as BINARY frames of pre-serialized orjson bytes:
+            # skips send_json's stdlib encoding + TEXT-frame UTF-8 validation
+            # on every token (the client decodes and parses instead).
+            # Token chunks arrive as raw Ollama NDJSON bytes and go out
+            # verbatim; everything else is serialized here.
+            async for chunk in orchestrator.search_stream(query, use_cache, provider):
+                if isinstance(chunk, bytes):
+                    await websocket.send_bytes(chunk)
+                else:
+                    await websocket.send_bytes(orjson.dumps(chunk))
                 
     except Exception as e:
         print(f"WebSocket error: {e}")
@@ -115,4 +175,22 @@ if __name__ == "__main__":
     print("Starting AI Search Engine API on 0.0.0.0:8000")
     print(f"Ollama URL: {os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')}")
     print(f"Cache directory: {os.getenv('CACHE_DIR', './cache')}")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if not os.getenv("OLLAMA_NUM_PARALLEL"):
+        print("Hint: set OLLAMA_NUM_PARALLEL=4 (and OLLAMA_MAX_LOADED_MODELS=2) "
+              "on the Ollama server so concurrent prompts are batched")
+    # uvloop + httptools are 2-4x faster than the default asyncio loop for
+    # websocket-heavy traffic; loop="auto" picks uvloop where it's
+    # installed (it has no Windows wheels). Multiple workers use the
+    # remaining cores (diskcache is SQLite-backed and process-safe, so
+    # this is fine). Note: websocket clients are per-worker; cross-worker
+    # fan-out would need a shared pubsub (e.g. Redis).
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="auto",
+        http="httptools",
+        ws="websockets",
+        ws_per_message_deflate=False,
+        workers=int(os.getenv("WEB_CONCURRENCY", "4"))
+    )
@@ -5,21 +5,41 @@ Uses diskcache for persistent storage with TTL expiration.
 
 import hashlib
 import json
+import re
+from dataclasses import dataclass
 from typing import Any, Optional, Dict, List
 from diskcache import Cache
+from cachetools import LRUCache
+import numpy as np
+import xxhash
 import os
 
+# Non-word runs collapsed to spaces during cache-key canonicalization
+_CANON_RE = re.compile(r'\W+')
+
+@dataclass
+class QuantizedEmbedding:
+    """Int8-quantized embedding with its per-vector dequantization scale."""
+    q: np.ndarray
+    scale: float
+
+    def dequantize(self) -> np.ndarray:
+        """Recover an approximate float32 vector."""
+        return self.q.astype(np.float32) * self.scale
+
 class CacheLayer:
-    def __init__(self, cache_dir: str = "./cache", ttl: int = 3600):
+    def __init__(self, cache_dir: str = "./cache", ttl: int = 3600, use_sha256: bool = False):
         """
         Initialize cache layer.
-        
+
         Args:
             cache_dir: Directory to store cache files
             ttl: Time-to-live for cache entries in seconds (default 1 hour)
+            use_sha256: Use SHA-256 for cache keys instead of xxh3
         """
         self.cache_dir = cache_dir
         self.ttl = ttl
+        self.use_sha256 = use_sha256
         
         # Create cache directory if it doesn't exist
         os.makedirs(cache_dir, exist_ok=True)
@@ -28,26 +48,70 @@ class CacheLayer:
         self.query_cache = Cache(os.path.join(cache_dir, "queries"))
         self.embedding_cache = Cache(os.path.join(cache_dir, "embeddings"))
         self.search_cache = Cache(os.path.join(cache_dir, "search_results"))
+        self.content_cache = Cache(os.path.join(cache_dir, "contents"))
+
+        # In-memory LRU tier in front of each disk cache: repeat hits on
+        # hot keys within a process skip SQLite entirely
+        self._mem_query = LRUCache(maxsize=1024)
+        self._mem_embedding = LRUCache(maxsize=1024)
+        self._mem_search = LRUCache(maxsize=1024)
+        self._mem_content = LRUCache(maxsize=1024)
         
         self.hits = 0
         self.misses = 0
     
     def _hash_key(self, key: str) -> str:
-        """Generate a hash for the key."""
-        return hashlib.sha256(key.encode()).hexdigest()
+        """
+        Generate a hash for the key.
+
+        Keys are content-addressed identically on get/set, so a
+        non-cryptographic hash is enough: xxh3-128 is far cheaper than
+        SHA-256 and its 32-char hex digest halves the index key size.
+        """
+        if self.use_sha256:
+            return hashlib.sha256(key.encode()).hexdigest()
+        return xxhash.xxh3_128_hexdigest(key.encode())
+
+    def make_key(self, query: str) -> str:
+        """
+        Canonicalize and hash a query into its cache key.
+
+        Casing and punctuation are normalized so trivial variants of the
+        same question ("Python GIL?" / "python gil") land on one entry.
+        Word order is preserved: reordered tokens can change the meaning
+        ("flights london to paris" vs "flights paris to london"), and
+        this key guards the query->answer cache, so collapsing them
+        would serve answers to a different question.
+
+        Callers that touch the cache more than once per request should
+        compute this once and pass it via the key= argument below.
+        """
+        tokens = _CANON_RE.sub(' ', query.lower()).split()
+        return self._hash_key(' '.join(tokens))
+
+    @staticmethod
+    def _tiered_get(mem: LRUCache, disk: Cache, key: str):
+        """Memory-first lookup that promotes disk hits into the LRU tier."""
+        value = mem.get(key)
+        if value is None:
+            value = disk.get(key)
+            if value is not None:
+                mem[key] = value
+        return value
     
-    def get_query_result(self, query: str) -> Optional[Dict[str, Any]]:
+    def get_query_result(self, query: str, key: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Get cached result for a query.
-        
+
         Args:
             query: The search query
-            
+            key: Precomputed key from make_key (skips re-hashing)
+
         Returns:
             Cached result or None if not found
         """
-        key = self._hash_key(query.lower().strip())
-        result = self.query_cache.get(key)
+        key = key or self.make_key(query)
+        result = self._tiered_get(self._mem_query, self.query_cache, key)
         
         if result:
             self.hits += 1
@@ -56,54 +120,111 @@ class CacheLayer:
             
         return result
     
-    def set_query_result(self, query: str, result: Dict[str, Any]) -> None:
+    def set_query_result(self, query: str, result: Dict[str, Any], key: Optional[str] = None) -> None:
         """
         Cache a query result.
-        
+
         Args:
             query: The search query
             result: The result to cache
+            key: Precomputed key from make_key (skips re-hashing)
         """
-        key = self._hash_key(query.lower().strip())
+        key = key or self.make_key(query)
+        self._mem_query[key] = result
         self.query_cache.set(key, result, expire=self.ttl)
     
-    def get_embeddings(self, text: str) -> Optional[List[float]]:
+    def get_all(self, query: str, key: Optional[str] = None) -> tuple:
+        """
+        Fetch the cached query result and search results in one batch.
+
+        Both lookups run inside diskcache transactions, so each cache
+        pays one SQLite BEGIN/COMMIT for the pair instead of one per
+        get call.
+
+        Args:
+            query: The search query
+            key: Precomputed key from make_key (skips re-hashing)
+
+        Returns:
+            Tuple of (query_result, search_results), either may be None
+        """
+        key = key or self.make_key(query)
+        query_result = self._mem_query.get(key)
+        search_results = self._mem_search.get(key)
+        if query_result is None or search_results is None:
+            with self.query_cache.transact(), self.search_cache.transact():
+                if query_result is None:
+                    query_result = self.query_cache.get(key)
+                    if query_result is not None:
+                        self._mem_query[key] = query_result
+                if search_results is None:
+                    search_results = self.search_cache.get(key)
+                    if search_results is not None:
+                        self._mem_search[key] = search_results
+
+        for result in (query_result, search_results):
+            if result:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        return query_result, search_results
+
+    def get_embeddings(self, text: str) -> Optional[QuantizedEmbedding]:
         """
         Get cached embeddings for text.
-        
+
         Args:
             text: The text to get embeddings for
-            
+
         Returns:
-            Cached embeddings or None if not found
+            QuantizedEmbedding (use .q/.scale for int8 math, or
+            .dequantize() for float32), or None if not found
         """
         key = self._hash_key(text)
-        return self.embedding_cache.get(key)
-    
+        buf = self._tiered_get(self._mem_embedding, self.embedding_cache, key)
+        if buf is None:
+            return None
+        scale = float(np.frombuffer(buf[:4], dtype=np.float32)[0])
+        q = np.frombuffer(buf[4:], dtype=np.int8)
+        return QuantizedEmbedding(q=q, scale=scale)
+
     def set_embeddings(self, text: str, embeddings: List[float]) -> None:
         """
         Cache embeddings for text.
-        
+
+        Stored as a per-vector scale (float32) followed by symmetric
+        int8 codes: 4 bytes per dimension down to 1, and the rounding
+        error is negligible for cosine top-k retrieval.
+
         Args:
             text: The text
             embeddings: The embeddings to cache
         """
         key = self._hash_key(text)
+        vec = np.asarray(embeddings, dtype=np.float32)
+        scale = float(np.abs(vec).max()) / 127.0 if vec.size else 1.0
+        if scale == 0.0:
+            scale = 1.0
+        q = np.round(vec / scale).astype(np.int8)
+        buf = np.float32(scale).tobytes() + q.tobytes()
+        self._mem_embedding[key] = buf
         # Embeddings don't expire as frequently
-        self.embedding_cache.set(key, embeddings, expire=self.ttl * 24)
+        self.embedding_cache.set(key, buf, expire=self.ttl * 24)
     
-    def get_search_results(self, query: str) -> Optional[List[Dict[str, str]]]:
+    def get_search_results(self, query: str, key: Optional[str] = None) -> Optional[List[Dict[str, str]]]:
         """
         Get cached search results.
-        
+
         Args:
             query: The search query
-            
+            key: Precomputed key from make_key (skips re-hashing)
+
         Returns:
             Cached search results or None if not found
         """
-        key = self._hash_key(query.lower().strip())
-        result = self.search_cache.get(key)
+        key = key or self.make_key(query)
+        result = self._tiered_get(self._mem_search, self.search_cache, key)
         
         if result:
             self.hits += 1
@@ -112,22 +233,64 @@ class CacheLayer:
             
         return result
     
-    def set_search_results(self, query: str, results: List[Dict[str, str]]) -> None:
+    def set_search_results(self, query: str, results: List[Dict[str, str]], key: Optional[str] = None) -> None:
         """
         Cache search results.
-        
+
         Args:
             query: The search query
             results: The search results to cache
+            key: Precomputed key from make_key (skips re-hashing)
         """
-        key = self._hash_key(query.lower().strip())
+        key = key or self.make_key(query)
+        self._mem_search[key] = results
         self.search_cache.set(key, results, expire=self.ttl)
     
+    def get_content(self, url: str) -> Optional[Dict[str, str]]:
+        """
+        Get cached extracted content for a URL.
+
+        Args:
+            url: The page URL
+
+        Returns:
+            Cached content dict (url/content/domain) or None if not found
+        """
+        key = self._hash_key(url)
+        result = self._tiered_get(self._mem_content, self.content_cache, key)
+
+        if result:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        return result
+
+    def set_content(self, url: str, content: Dict[str, str]) -> None:
+        """
+        Cache extracted content for a URL.
+
+        Keyed by URL rather than query, so different queries that surface
+        the same page (common for Wikipedia) share one fetch + parse.
+
+        Args:
+            url: The page URL
+            content: The extracted content dict to cache
+        """
+        key = self._hash_key(url)
+        self._mem_content[key] = content
+        self.content_cache.set(key, content, expire=self.ttl)
+
     def clear_all(self) -> None:
         """Clear all caches."""
+        self._mem_query.clear()
+        self._mem_embedding.clear()
+        self._mem_search.clear()
+        self._mem_content.clear()
         self.query_cache.clear()
         self.embedding_cache.clear()
         self.search_cache.clear()
+        self.content_cache.clear()
         self.hits = 0
         self.misses = 0
     
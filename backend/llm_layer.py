@@ -4,14 +4,109 @@ Supports dual-LLM architecture with small and large models.
 """
 
 import requests
+from requests.adapters import HTTPAdapter, Retry
+import httpx
 import json
-from typing import Dict, List, Generator, Optional
+import orjson
+import re
+from typing import Dict, Final, List, AsyncGenerator, Optional
+
+# Leading numbers (1., 1), bullets (-, *), and quotes on suggestion lines
+_SUGGESTION_PREFIX_RE = re.compile(r'^[\d\.\-\*\s"\']+')
+
+# Fast-path token extraction from Ollama stream frames. Set to False to
+# always go through the full JSON parser.
+FAST_TOKEN_SCAN = True
+
+_RESPONSE_KEY = b'"response":"'
+
+def _extract_response_fast(line: bytes):
+    """
+    Pull the "response" string out of a standard Ollama NDJSON frame
+    without building a dict.
+
+    Only handles the common case of an unescaped token string; frames
+    containing escapes (or missing the key) return None so the caller
+    falls back to a full JSON parse.
+
+    Args:
+        line: One NDJSON frame as bytes
+
+    Returns:
+        (token, done) tuple, or None when the fast path doesn't apply
+    """
+    start = line.find(_RESPONSE_KEY)
+    if start == -1:
+        return None
+    start += len(_RESPONSE_KEY)
+    end = line.find(b'"', start)
+    if end == -1:
+        return None
+    segment = line[start:end]
+    if b"\\" in segment:
+        # Escaped content: let the real parser handle it
+        return None
+    try:
+        token = segment.decode()
+    except UnicodeDecodeError:
+        return None
+    return token, b'"done":true' in line
+
+# Prompt templates, built once at import instead of per call
+_ANALYZE_TMPL: Final = """Analyze this search query and provide:
+1. The main intent/topic
+2. Key entities or concepts
+3. Whether it needs real-time information
+4. 2-3 refined search queries to find relevant information
+
+Query: {query}
+
+Respond in JSON format:
+{{
+  "intent": "brief description",
+  "entities": ["entity1", "entity2"],
+  "needs_realtime": true/false,
+  "search_queries": ["query1", "query2"]
+}}"""
+
+_ANSWER_TMPL: Final = """You are a helpful and accurate AI search assistant. Answer the user's question using the provided context from web sources.
+
+User Question: {query}
+
+Context from web sources:
+{context}
+
+Sources:
+{sources_text}
+
+Instructions:
+1. Prioritize the provided context for specific facts and details.
+2. Be accurate with names and relationships (e.g., clarify who is a brother vs son).
+3. If the context is ambiguous, you may use general knowledge to clarify, but prioritize the context.
+4. Cite sources using [1], [2], etc.
+5. Provide a detailed and comprehensive answer.
+
+Answer:"""
+
+# Marker the model is asked to emit between the answer and the
+# follow-up questions when both come from one generation
+SUGGESTIONS_MARKER: Final = "FOLLOW_UP_QUESTIONS:"
+
+_ANSWER_WITH_SUGGESTIONS_TMPL: Final = _ANSWER_TMPL.replace(
+    "\n\nAnswer:",
+    '\n6. After the answer, add one final line: "FOLLOW_UP_QUESTIONS:" '
+    "followed by a JSON array of 6 short follow-up search questions."
+    "\n\nAnswer:"
+)
+
+_SUGGESTIONS_TMPL: Final = """Based on the search query "{query}", generate 6 short, relevant follow-up search questions.
+        Return ONLY the questions, one per line. Do not number them. Do not add quotes."""
 
 class LLMLayer:
     def __init__(self, base_url: str = "http://localhost:11434", small_model: str = "mistral:7b", large_model: str = "mistral:7b"):
         """
         Initialize LLM layer with Ollama.
-        
+
         Args:
             base_url: Ollama API base URL
             small_model: Model name for query analysis & planning
@@ -20,59 +115,56 @@ class LLMLayer:
         self.base_url = base_url
         self.small_model = small_model
         self.large_model = large_model
-    
+
+        # Single pooled async client so concurrent requests reuse keep-alive
+        # connections instead of opening a new TCP connection per Ollama call
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+            timeout=120
+        )
+
+        # Pooled session for the sync path (health checks), so repeated
+        # polls reuse one TCP connection instead of re-handshaking
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=64,
+            max_retries=Retry(total=3, backoff_factor=0.1)
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    async def aclose(self) -> None:
+        """Close the pooled HTTP client (wired to FastAPI's lifespan)."""
+        await self._client.aclose()
+
     def check_connection(self) -> bool:
         """Check if Ollama is running and accessible."""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
+            response = self._session.get(f"{self.base_url}/api/tags", timeout=5)
             return response.status_code == 200
         except Exception as e:
             print(f"Ollama connection error: {e}")
             return False
-    
-    def analyze_query(self, query: str) -> Dict[str, any]:
+
+    async def analyze_query(self, query: str) -> Dict[str, any]:
         """
         Analyze the query using small model to understand intent and plan.
-        
+
         Args:
             query: User's search query
-            
+
         Returns:
             Dict with query analysis (intent, subqueries, etc.)
         """
-        prompt = f"""Analyze this search query and provide:
-1. The main intent/topic
-2. Key entities or concepts
-3. Whether it needs real-time information
-4. 2-3 refined search queries to find relevant information
-
-Query: {query}
+        prompt = _ANALYZE_TMPL.format(query=query)
 
-Respond in JSON format:
-{{
-  "intent": "brief description",
-  "entities": ["entity1", "entity2"],
-  "needs_realtime": true/false,
-  "search_queries": ["query1", "query2"]
-}}"""
-        
         try:
-            response = self._generate(self.small_model, prompt, temperature=0.3)
-            
-            # Try to extract JSON from response
-            response_text = response.strip()
-            
-            # Find JSON block
-            if "```json" in response_text:
-                start = response_text.find("```json") + 7
-                end = response_text.find("```", start)
-                response_text = response_text[start:end].strip()
-            elif "{" in response_text:
-                start = response_text.find("{")
-                end = response_text.rfind("}") + 1
-                response_text = response_text[start:end]
-            
-            analysis = json.loads(response_text)
+            # format="json" constrains Ollama's decoding to valid JSON, so
+            # no code-fence / brace hunting is needed on the response
+            response = await self._generate(self.small_model, prompt, temperature=0.3, format_json=True)
+            analysis = json.loads(response)
             return analysis
         except Exception as e:
             print(f"Query analysis error: {e}")
@@ -83,141 +175,202 @@ Respond in JSON format:
                 "needs_realtime": True,
                 "search_queries": [query]
             }
-    
-    def generate_answer(self, query: str, context: str, sources: List[Dict[str, str]], stream: bool = False) -> Generator[str, None, None] or str:
+
+    async def generate_answer(self, query: str, context: str, sources: List[Dict[str, str]], stream: bool = False, raw: bool = False, with_suggestions: bool = False) -> AsyncGenerator[str, None] or str:
         """
         Generate final answer using large model with retrieved context.
-        
+
         Args:
             query: User's original query
             context: Retrieved context from RAG
             sources: List of source URLs and metadata
             stream: Whether to stream the response
-            
+            raw: When streaming, yield Ollama's NDJSON frames as bytes
+                 instead of decoded token strings
+            with_suggestions: Ask the model to append follow-up questions
+                 after a SUGGESTIONS_MARKER line, so answer + suggestions
+                 cost one forward pass instead of two
+
         Returns:
-            Generated answer (streaming or complete)
+            Generated answer (async generator when streaming, str otherwise)
         """
         # Format sources
         sources_text = "\n".join([f"- {s.get('title', s.get('domain', s['url']))}: {s['url']}" for s in sources])
-        
-        prompt = f"""You are a helpful and accurate AI search assistant. Answer the user's question using the provided context from web sources.
-        
-User Question: {query}
 
-Context from web sources:
-{context}
-
-Sources:
-{sources_text}
+        tmpl = _ANSWER_WITH_SUGGESTIONS_TMPL if with_suggestions else _ANSWER_TMPL
+        prompt = tmpl.format(query=query, context=context, sources_text=sources_text)
 
-Instructions:
-1. Prioritize the provided context for specific facts and details.
-2. Be accurate with names and relationships (e.g., clarify who is a brother vs son).
-3. If the context is ambiguous, you may use general knowledge to clarify, but prioritize the context.
-4. Cite sources using [1], [2], etc.
-5. Provide a detailed and comprehensive answer.
-
-Answer:"""
-        
         if stream:
+            if raw:
+                return self._generate_stream_raw(self.large_model, prompt, temperature=0.5)
             return self._generate_stream(self.large_model, prompt, temperature=0.5)
         else:
-            return self._generate(self.large_model, prompt, temperature=0.5)
-    
-    def _generate(self, model: str, prompt: str, temperature: float = 0.7) -> str:
+            return await self._generate(self.large_model, prompt, temperature=0.5)
+
+    async def _generate(self, model: str, prompt: str, temperature: float = 0.7, format_json: bool = False) -> str:
         """
         Generate completion from Ollama (non-streaming).
-        
+
         Args:
             model: Model name
             prompt: Prompt text
             temperature: Sampling temperature
-            
+            format_json: Constrain decoding to valid JSON output
+
         Returns:
             Generated text
         """
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "temperature": temperature,
+            "stream": False
+        }
+        if format_json:
+            payload["format"] = "json"
+
         try:
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": model,
-                    "prompt": prompt,
-                    "temperature": temperature,
-                    "stream": False
-                },
-                timeout=120
-            )
-            
+            response = await self._client.post("/api/generate", json=payload)
+
             if response.status_code == 200:
                 return response.json().get("response", "")
             else:
                 return f"Error: LLM returned status {response.status_code}"
         except Exception as e:
             return f"Error generating response: {e}"
-    
-    def _generate_stream(self, model: str, prompt: str, temperature: float = 0.7) -> Generator[str, None, None]:
+
+    async def _generate_stream(self, model: str, prompt: str, temperature: float = 0.7) -> AsyncGenerator[str, None]:
         """
         Generate completion from Ollama (streaming).
-        
+
         Args:
             model: Model name
             prompt: Prompt text
             temperature: Sampling temperature
-            
+
         Yields:
             Generated text chunks
         """
         try:
-            response = requests.post(
-                f"{self.base_url}/api/generate",
+            async with self._client.stream(
+                "POST",
+                "/api/generate",
                 json={
                     "model": model,
                     "prompt": prompt,
                     "temperature": temperature,
                     "stream": True
-                },
-                stream=True,
-                timeout=120
-            )
-            
-            if response.status_code == 200:
-                for line in response.iter_lines():
-                    if line:
-                        try:
-                            data = json.loads(line)
-                            if "response" in data:
-                                yield data["response"]
-                            
-                            if data.get("done", False):
-                                break
-                        except json.JSONDecodeError:
-                            continue
-            else:
-                yield f"Error: LLM returned status {response.status_code}"
+                }
+            ) as response:
+                if response.status_code != 200:
+                    yield f"Error: LLM returned status {response.status_code}"
+                    return
+
+                async for line in self._aiter_ndjson(response):
+                    fast = _extract_response_fast(line) if FAST_TOKEN_SCAN else None
+                    if fast is not None:
+                        token, done = fast
+                        if token:
+                            yield token
+                        if done:
+                            break
+                        continue
+                    try:
+                        # orjson: one NDJSON frame per token, so the
+                        # C parser matters here
+                        data = orjson.loads(line)
+                        if "response" in data:
+                            yield data["response"]
+
+                        if data.get("done", False):
+                            break
+                    except orjson.JSONDecodeError:
+                        continue
         except Exception as e:
             yield f"Error generating response: {e}"
-    def generate_suggestions(self, query: str) -> List[str]:
+
+    @staticmethod
+    async def _aiter_ndjson(response) -> AsyncGenerator[bytes, None]:
+        """
+        Split a streaming response into NDJSON lines as bytes.
+
+        Manual newline framing over aiter_bytes instead of aiter_lines:
+        no per-line str decode (orjson accepts bytes directly), which
+        matters when Ollama emits one frame per generated token.
+
+        Args:
+            response: An open httpx streaming response
+
+        Yields:
+            NDJSON lines as bytes (no trailing newline)
+        """
+        buffer = bytearray()
+        async for chunk in response.aiter_bytes():
+            buffer += chunk
+            while (nl := buffer.find(b"\n")) != -1:
+                line = bytes(buffer[:nl])
+                del buffer[:nl + 1]
+                if line:
+                    yield line
+        if buffer:
+            yield bytes(buffer)
+
+    async def _generate_stream_raw(self, model: str, prompt: str, temperature: float = 0.7) -> AsyncGenerator[bytes, None]:
+        """
+        Generate completion from Ollama, yielding raw NDJSON frames.
+
+        Consumers that forward frames to a client verbatim (e.g. the
+        websocket token stream) use this to avoid a per-token
+        parse/build/re-serialize round-trip. Error conditions are
+        reported in the same frame shape so downstream handling is
+        uniform.
+
+        Args:
+            model: Model name
+            prompt: Prompt text
+            temperature: Sampling temperature
+
+        Yields:
+            Raw NDJSON lines as bytes (no trailing newline)
+        """
+        try:
+            async with self._client.stream(
+                "POST",
+                "/api/generate",
+                json={
+                    "model": model,
+                    "prompt": prompt,
+                    "temperature": temperature,
+                    "stream": True
+                }
+            ) as response:
+                if response.status_code != 200:
+                    yield orjson.dumps({"response": f"Error: LLM returned status {response.status_code}", "done": True})
+                    return
+
+                async for line in self._aiter_ndjson(response):
+                    yield line
+        except Exception as e:
+            yield orjson.dumps({"response": f"Error generating response: {e}", "done": True})
+    async def generate_suggestions(self, query: str) -> List[str]:
         """
         Generate follow-up search suggestions based on the query.
-        
+
         Args:
             query: User's search query
-            
+
         Returns:
             List of suggestion strings
         """
-        prompt = f"""Based on the search query "{query}", generate 6 short, relevant follow-up search questions.
-        Return ONLY the questions, one per line. Do not number them. Do not add quotes."""
-        
+        prompt = _SUGGESTIONS_TMPL.format(query=query)
+
         try:
-            response = self._generate(self.small_model, prompt, temperature=0.5)
+            response = await self._generate(self.small_model, prompt, temperature=0.5)
             suggestions = []
-            import re
             for line in response.split('\n'):
                 line = line.strip()
                 if line:
-                    # Remove leading numbers (1., 1), bullets (-, *), and quotes
-                    cleaned = re.sub(r'^[\d\.\-\*\s"\']+', '', line).strip('"\'')
+                    cleaned = _SUGGESTION_PREFIX_RE.sub('', line).strip('"\'')
                     if cleaned:
                         suggestions.append(cleaned)
             return suggestions[:6]
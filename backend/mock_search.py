@@ -2,6 +2,10 @@
 Mock search results for testing when DuckDuckGo is rate-limited.
 """
 
+import re
+import sys
+import types
+
 MOCK_RESULTS = {
     "machine learning": {
         "search_results": [
@@ -47,15 +51,30 @@ MOCK_RESULTS = {
     }
 }
 
+# Intern the short repeated strings and freeze the table. The data is
+# read-only, and keeping it immutable lets forked uvicorn workers share
+# the pages copy-on-write instead of each holding their own copy.
+for _entry in MOCK_RESULTS.values():
+    for _result in _entry["search_results"]:
+        _result["title"] = sys.intern(_result["title"])
+        _result["url"] = sys.intern(_result["url"])
+    for _content in _entry["extracted_contents"]:
+        _content["url"] = sys.intern(_content["url"])
+        _content["domain"] = sys.intern(_content["domain"])
+
+MOCK_RESULTS = types.MappingProxyType(MOCK_RESULTS)
+
+# Single alternation over all mock keys, compiled once: one DFA pass over
+# the query instead of a substring scan per key
+_MOCK_RE = re.compile("|".join(re.escape(k) for k in MOCK_RESULTS))
+
 def get_mock_results(query):
     """Get mock results for common queries."""
-    query_lower = query.lower()
-    
     # Try to find a matching mock result
-    for key, results in MOCK_RESULTS.items():
-        if key in query_lower:
-            return results
-    
+    match = _MOCK_RE.search(query.lower())
+    if match:
+        return MOCK_RESULTS[match.group(0)]
+
     # Default result
     return {
         "search_results": [
@@ -5,21 +5,20 @@ Manages the flow: Query Analysis → Search → RAG → Answer Generation
 
 from typing import TypedDict, List, Dict, Any
 from langgraph.graph import StateGraph, END
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 import asyncio
-import nest_asyncio
-from concurrent.futures import ThreadPoolExecutor, as_completed
-
-# Apply nest_asyncio to allow nested event loops
-nest_asyncio.apply()
+import orjson
 
 from search_layer import SearchLayer
 from rag_pipeline import RAGPipeline
-from llm_layer import LLMLayer
+from llm_layer import LLMLayer, FAST_TOKEN_SCAN, SUGGESTIONS_MARKER, _extract_response_fast
 from cache_layer import CacheLayer
 
 class SearchState(TypedDict):
     """State for the search pipeline."""
     query: str
+    cache_key: str
     query_analysis: Dict[str, Any]
     search_results: List[Dict[str, str]]
     extracted_contents: List[Dict[str, str]]
@@ -30,6 +29,7 @@ class SearchState(TypedDict):
     error: str | None
     use_cache: bool
     cached_result: Dict[str, Any] | None
+    cached_search: List[Dict[str, str]] | None
 
 class SearchOrchestrator:
     """Orchestrates the full AI search pipeline using LangGraph."""
@@ -46,6 +46,14 @@ class SearchOrchestrator:
         self.search_layer = SearchLayer()
         self.rag = RAGPipeline()
         self.llm = LLMLayer(base_url=ollama_url, small_model="mistral:7b", large_model="mistral:7b")
+
+        # Long-lived worker pools: provider fan-out and CPU-bound RAG work
+        # reuse these instead of paying thread spawn/teardown per query
+        self._search_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="search")
+        self._aux_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="aux")
+
+        # Singleflight: concurrent identical queries share one pipeline run
+        self._inflight: Dict[tuple, asyncio.Task] = {}
         
         # Build the state graph
         self.graph = self._build_graph()
@@ -81,30 +89,36 @@ class SearchOrchestrator:
         
         return workflow.compile()
     
-    def _check_cache(self, state: SearchState) -> SearchState:
+    async def _check_cache(self, state: SearchState) -> SearchState:
         """Check if we have a cached result for this query."""
         query = state["query"]
-        
+
         if state.get("use_cache", True):
-            cached = self.cache.get_query_result(query)
+            # One batched read covers both the full result and the search
+            # results; _search_web reuses the latter when applicable.
+            # SQLite-backed reads go through a thread to keep the loop free.
+            cached, cached_search = await asyncio.to_thread(
+                self.cache.get_all, query, key=state["cache_key"]
+            )
+            state["cached_search"] = cached_search
             if cached:
                 print(f"✓ Cache hit for query: {query}")
                 state["cached_result"] = cached
                 state["answer"] = cached.get("answer", "")
                 state["sources"] = cached.get("sources", [])
                 return state
-        
+
         print(f"✗ Cache miss for query: {query}")
         state["cached_result"] = None
         return state
     
-    def _analyze_query(self, state: SearchState) -> SearchState:
+    async def _analyze_query(self, state: SearchState) -> SearchState:
         """Analyze the query using small LLM."""
         print("→ Analyzing query...")
         query = state["query"]
-        
+
         try:
-            analysis = self.llm.analyze_query(query)
+            analysis = await self.llm.analyze_query(query)
             # Preserve provider if it was set in initial state
             if "provider" in state.get("query_analysis", {}):
                 analysis["provider"] = state["query_analysis"]["provider"]
@@ -123,7 +137,7 @@ class SearchOrchestrator:
         
         return state
     
-    def _search_web(self, state: SearchState) -> SearchState:
+    async def _search_web(self, state: SearchState) -> SearchState:
         """Perform web search and content extraction."""
         print("→ Searching web...")
         query = state["query"]
@@ -137,70 +151,111 @@ class SearchOrchestrator:
         if provider == "all":
             all_results = []
             all_contents = []
-            # Search all providers
-            for p in ["google", "duckduckgo", "wikipedia"]:
-                print(f"  → Searching {p}...")
+            # Fan out to all providers on the shared pool so wall-clock is
+            # the slowest provider, not the sum of all three.
+            # Note: We are not caching 'all' searches as a single block currently
+            loop = asyncio.get_running_loop()
+
+            async def run_provider(p):
+                result = await loop.run_in_executor(
+                    self._search_pool,
+                    lambda: self.search_layer.search_and_extract(primary_query, provider=p)
+                )
+                return p, result
+
+            tasks = [run_provider(p) for p in ["google", "duckduckgo", "wikipedia"]]
+            for task in asyncio.as_completed(tasks):
                 try:
-                    # Check cache for individual provider search
-                    # Note: We are not caching 'all' searches as a single block currently
-                    result = self.search_layer.search_and_extract(primary_query, provider=p)
+                    p, result = await task
                     all_results.extend(result.get("search_results", []))
                     all_contents.extend(result.get("extracted_contents", []))
+                    print(f"  → Got results from {p}")
                 except Exception as e:
-                    print(f"  Error searching {p}: {e}")
+                    print(f"  Error searching: {e}")
             
             state["search_results"] = all_results
             state["extracted_contents"] = all_contents
             print(f"  Found {len(state['search_results'])} total results from all sources")
             
         else:
-            # Check search cache (only for default provider for now)
-            cached_search = self.cache.get_search_results(primary_query)
+            # Check search cache (only for default provider for now); reuse
+            # the batched read from _check_cache when the refined query is
+            # unchanged
+            if primary_query == query:
+                cached_search = state.get("cached_search")
+            else:
+                cached_search = await asyncio.to_thread(
+                    self.cache.get_search_results, primary_query
+                )
             if cached_search and provider == "duckduckgo":
                 print("  ✓ Using cached search results")
                 state["search_results"] = cached_search
             else:
-                result = self.search_layer.search_and_extract(primary_query, provider=provider)
+                result = await asyncio.get_running_loop().run_in_executor(
+                    self._search_pool,
+                    lambda: self.search_layer.search_and_extract(primary_query, provider=provider)
+                )
                 state["search_results"] = result.get("search_results", [])
                 state["extracted_contents"] = result.get("extracted_contents", [])
-                
+
                 # Cache search results (only for default provider)
                 if provider == "duckduckgo":
-                    self.cache.set_search_results(primary_query, state["search_results"])
+                    await asyncio.to_thread(
+                        self.cache.set_search_results, primary_query, state["search_results"]
+                    )
                 print(f"  Found {len(state['search_results'])} results")
         
         return state
     
-    def _extract_and_rag(self, state: SearchState) -> SearchState:
+    async def _iter_contents_cached(self, urls: List[str]):
+        """
+        Yield extracted page contents, serving repeats from the per-URL
+        content cache and fetching only the misses.
+
+        The same page surfacing for a different query (common for
+        Wikipedia) skips the HTTP fetch and HTML parse entirely.
+        """
+        misses = []
+        for url in urls:
+            doc = await asyncio.to_thread(self.cache.get_content, url)
+            if doc:
+                yield doc
+            else:
+                misses.append(url)
+
+        async for doc in self.search_layer.iter_contents(misses):
+            await asyncio.to_thread(self.cache.set_content, doc["url"], doc)
+            yield doc
+
+    async def _extract_and_rag(self, state: SearchState) -> SearchState:
         """Extract content and perform RAG retrieval."""
         print("→ Processing RAG pipeline...")
         query = state["query"]
-        
-        # If we have cached search results, we need to extract content
+
+        # If we have cached search results, we need to extract content.
+        # Pages stream out of iter_contents as they arrive, so each
+        # document's chunks are embedded while later fetches are still
+        # in flight instead of after the slowest one.
+        rag_results = {}
         if "extracted_contents" not in state or not state["extracted_contents"]:
             search_results = state.get("search_results", [])
             urls = [r["url"] for r in search_results]
-            
-            try:
-                # Try to get existing loop
-                loop = asyncio.get_event_loop()
-            except RuntimeError:
-                # Create new loop if none exists
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-            
+
             try:
-                # With nest_asyncio, run_until_complete should work even if loop is running
-                extracted = loop.run_until_complete(self.search_layer.fetch_all_contents(urls))
-                state["extracted_contents"] = extracted
+                rag_results = await self.rag.process_documents_stream(
+                    self._iter_contents_cached(urls), query,
+                    top_k=10, executor=self._aux_pool
+                )
+                state["extracted_contents"] = rag_results.get("sources", [])
             except Exception as e:
                 print(f"Error extracting content: {e}")
                 state["extracted_contents"] = []
-        
-        # Perform RAG
+
+        # Perform RAG (batch path when contents were already available)
         extracted_contents = state.get("extracted_contents", [])
         if extracted_contents:
-            rag_results = self.rag.process_documents(extracted_contents, query, top_k=10)
+            if not rag_results:
+                rag_results = self.rag.process_documents(extracted_contents, query, top_k=10)
             state["rag_results"] = rag_results
             state["context"] = self.rag.format_context(rag_results)
             state["sources"] = rag_results.get("sources", [])
@@ -213,19 +268,19 @@ class SearchOrchestrator:
         
         return state
     
-    def _generate_answer(self, state: SearchState) -> SearchState:
+    async def _generate_answer(self, state: SearchState) -> SearchState:
         """Generate final answer using large LLM."""
         print("→ Generating answer...")
         query = state["query"]
         context = state.get("context", "")
         sources = state.get("sources", [])
-        
+
         if not context:
             state["answer"] = "I couldn't find enough relevant information to answer your question."
             return state
-        
+
         try:
-            answer = self.llm.generate_answer(query, context, sources, stream=False)
+            answer = await self.llm.generate_answer(query, context, sources, stream=False)
             state["answer"] = answer
             
             # Cache the result
@@ -234,7 +289,7 @@ class SearchOrchestrator:
                 "sources": sources,
                 "query": query
             }
-            self.cache.set_query_result(query, cache_data)
+            self.cache.set_query_result(query, cache_data, key=state["cache_key"])
             
             print("  ✓ Answer generated")
         except Exception as e:
@@ -243,18 +298,48 @@ class SearchOrchestrator:
         
         return state
     
-    def search(self, query: str, use_cache: bool = True, provider: str = "all") -> Dict[str, Any]:
+    async def aclose(self) -> None:
+        """Release pooled resources (called from FastAPI's lifespan)."""
+        self._search_pool.shutdown(wait=False)
+        self._aux_pool.shutdown(wait=False)
+        await self.search_layer.close()
+        await self.llm.aclose()
+
+    async def search(self, query: str, use_cache: bool = True, provider: str = "all") -> Dict[str, Any]:
         """
         Execute the full search pipeline.
-        
+
+        Duplicate concurrent calls for the same (query, provider) are
+        coalesced: the second caller awaits the first run's result
+        instead of re-running LLM + search + RAG.
+
         Args:
             query: User's search query
             use_cache: Whether to use cached results
             provider: Search provider to use
-            
+
         Returns:
             Dict with answer, sources, and metadata
         """
+        return await self._coalesce(
+            ("search", query, provider),
+            lambda: self._search_impl(query, use_cache, provider)
+        )
+
+    def _coalesce(self, key: tuple, factory) -> asyncio.Task:
+        """
+        Return the in-flight task for key, starting it via factory if
+        none is running. Duplicate concurrent callers share one task.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t: self._inflight.pop(key, None))
+        return task
+
+    async def _search_impl(self, query: str, use_cache: bool, provider: str) -> Dict[str, Any]:
+        """Run the pipeline graph for one query (see search())."""
         print(f"\n{'='*60}")
         print(f"Query: {query} (Provider: {provider})")
         print(f"{'='*60}")
@@ -262,6 +347,7 @@ class SearchOrchestrator:
         # Initialize state
         initial_state = SearchState(
             query=query,
+            cache_key=self.cache.make_key(query),
             query_analysis={"provider": provider},
             search_results=[],
             extracted_contents=[],
@@ -271,12 +357,13 @@ class SearchOrchestrator:
             sources=[],
             error=None,
             use_cache=use_cache,
-            cached_result=None
+            cached_result=None,
+            cached_search=None
         )
         
         # Run the graph
         try:
-            final_state = self.graph.invoke(initial_state)
+            final_state = await self.graph.ainvoke(initial_state)
             
             # Return results
             return {
@@ -299,128 +386,205 @@ class SearchOrchestrator:
                 "error": str(e)
             }
     
-    def search_stream(self, query: str, use_cache: bool = True, provider: str = "all"):
+    @staticmethod
+    def _parse_suggestion_tail(tail: str) -> List[str]:
+        """Parse the follow-up questions JSON array from an answer tail."""
+        start = tail.find('[')
+        end = tail.rfind(']')
+        if start == -1 or end <= start:
+            return []
+        try:
+            items = orjson.loads(tail[start:end + 1])
+        except orjson.JSONDecodeError:
+            return []
+        if not isinstance(items, list):
+            return []
+        return [s.strip() for s in items if isinstance(s, str) and s.strip()][:6]
+
+    async def _prepare_answer_inputs(self, query: str, provider: str) -> Dict[str, Any]:
+        """
+        Run the expensive shared prefix of the streaming pipeline:
+        query analysis, provider search/extraction, and RAG retrieval.
+
+        search_stream awaits this through _coalesce, so N identical
+        concurrent streams pay for one analysis + fan-out + RAG run and
+        only answer generation happens per request.
+        """
+        await self.llm.analyze_query(query)
+        loop = asyncio.get_running_loop()
+
+        if provider == "all":
+            all_results = []
+            all_contents = []
+
+            # Fan out blocking provider searches on the shared pool
+            def search_provider(p):
+                try:
+                    return p, self.search_layer.search_and_extract(query, provider=p)
+                except Exception as e:
+                    print(f"Error searching {p}: {e}")
+                    return p, {"search_results": [], "extracted_contents": []}
+
+            tasks = [
+                loop.run_in_executor(self._search_pool, search_provider, p)
+                for p in ["google", "duckduckgo", "wikipedia"]
+            ]
+            for future in asyncio.as_completed(tasks):
+                provider_name, search_results_data = await future
+                print(f"  → Got results from {provider_name}")
+                all_results.extend(search_results_data.get("search_results", []))
+                all_contents.extend(search_results_data.get("extracted_contents", []))
+
+            extracted = all_contents
+        else:
+            search_results_data = await loop.run_in_executor(
+                self._search_pool,
+                lambda: self.search_layer.search_and_extract(query, provider=provider)
+            )
+            extracted = search_results_data.get("extracted_contents", [])
+
+        # Chunking + embedding is CPU-bound; run it in a worker thread so
+        # the event loop keeps serving other requests meanwhile
+        rag_results = await loop.run_in_executor(
+            self._aux_pool,
+            lambda: self.rag.process_documents(extracted, query, top_k=10)
+        )
+        return {
+            "context": self.rag.format_context(rag_results),
+            "sources": rag_results.get("sources", [])
+        }
+
+    async def search_stream(self, query: str, use_cache: bool = True, provider: str = "all"):
         """
         Execute search pipeline with streaming answer generation.
-        
+
         Args:
             query: User's search query
             use_cache: Whether to use cached results
             provider: Search provider to use
-            
+
         Yields:
             Dict chunks with progress updates and answer tokens
         """
+        # Normalize + hash the query once; every cache touch below reuses it
+        cache_key = self.cache.make_key(query)
+
         # Check cache first
         if use_cache:
-            cached = self.cache.get_query_result(query)
+            cached = self.cache.get_query_result(query, key=cache_key)
             if cached:
                 # Send cached result first
                 yield {"type": "cached", "data": cached}
-                
+
                 # Check if we have cached suggestions, if not generate them
                 if "suggestions" in cached and cached["suggestions"]:
                     yield {"type": "suggestions", "data": cached["suggestions"]}
                 else:
                     # Generate new suggestions for cached result
                     yield {"type": "status", "message": "Generating follow-up questions..."}
-                    suggestions = self.llm.generate_suggestions(query)
+                    suggestions = await self.llm.generate_suggestions(query)
                     yield {"type": "suggestions", "data": suggestions}
-                    
+
                     # Update cache with suggestions
                     cached["suggestions"] = suggestions
-                    self.cache.set_query_result(query, cached)
-                
+                    self.cache.set_query_result(query, cached, key=cache_key)
+
                 return
-        
-        # Run pipeline up to answer generation
+
+        # Run pipeline up to answer generation. Suggestions ride along
+        # with the answer generation below (one forward pass for both).
+        # Concurrent streams for the same (query, provider) coalesce on
+        # this stage: the second request awaits the first run instead of
+        # repeating LLM analysis + provider fan-out + RAG.
         yield {"type": "status", "message": "Analyzing query..."}
-        analysis = self.llm.analyze_query(query)
-        
-        if provider == "all":
-            all_results = []
-            all_contents = []
-            
-            # Define providers to search
-            providers = ["google", "duckduckgo", "wikipedia"]
-            
-            yield {"type": "status", "message": "Searching all sources in parallel..."}
-            
-            # Helper function for parallel execution
-            def search_provider(p):
-                try:
-                    return p, self.search_layer.search_and_extract(query, provider=p)
-                except Exception as e:
-                    print(f"Error searching {p}: {e}")
-                    return p, {"search_results": [], "extracted_contents": []}
-            
-            # Execute searches in parallel
-            with ThreadPoolExecutor(max_workers=3) as executor:
-                # Submit all tasks
-                future_to_provider = {executor.submit(search_provider, p): p for p in providers}
-                
-                # Collect results as they complete
-                for future in as_completed(future_to_provider):
-                    provider_name, search_results_data = future.result()
-                    yield {"type": "status", "message": f"Received results from {provider_name}"}
-                    all_results.extend(search_results_data.get("search_results", []))
-                    all_contents.extend(search_results_data.get("extracted_contents", []))
-            
-            search_results_data = {
-                "search_results": all_results,
-                "extracted_contents": all_contents
-            }
-            
-        else:
-            yield {"type": "status", "message": f"Searching with {provider}..."}
-            search_results_data = self.search_layer.search_and_extract(query, provider=provider)
-        
-        yield {"type": "status", "message": "Processing content..."}
-        extracted = search_results_data.get("extracted_contents", [])
-        rag_results = self.rag.process_documents(extracted, query, top_k=10)
-        context = self.rag.format_context(rag_results)
-        sources = rag_results.get("sources", [])
-        
-        # Send sources
+        yield {"type": "status", "message": "Searching and processing sources..."}
+        prepared = await self._coalesce(
+            ("prepare", query, provider),
+            lambda: self._prepare_answer_inputs(query, provider)
+        )
+        context = prepared["context"]
+        sources = prepared["sources"]
+
         yield {"type": "sources", "data": sources}
-        
-        yield {"type": "status", "message": "Generating answer & suggestions..."}
-        
-        # Start suggestion generation in background
-        executor = ThreadPoolExecutor(max_workers=1)
-        suggestion_future = executor.submit(self.llm.generate_suggestions, query)
-        suggestions_sent = False
-        
-        # Stream answer generation
+
+        yield {"type": "status", "message": "Generating answer..."}
+
+        # Stream answer generation. Token chunks are forwarded as the raw
+        # Ollama NDJSON frame bytes (the websocket sends them verbatim);
+        # we parse each frame once here only to accumulate the answer.
+        #
+        # The prompt asks the model to append a FOLLOW_UP_QUESTIONS: line
+        # after the answer, so suggestions come out of the same generation
+        # instead of a second LLM call (which Ollama would serialize after
+        # the answer anyway). A holdback window of marker length keeps the
+        # suggestions tail from ever reaching the client: frames are only
+        # released once the marker can no longer start inside them.
+        marker = SUGGESTIONS_MARKER
         answer_parts = []
-        try:
-            for token in self.llm.generate_answer(query, context, sources, stream=True):
-                answer_parts.append(token)
-                yield {"type": "token", "data": token}
-                
-                # Check if suggestions are ready
-                if not suggestions_sent and suggestion_future.done():
-                    suggestions = suggestion_future.result()
-                    yield {"type": "suggestions", "data": suggestions}
-                    suggestions_sent = True
-        finally:
-            # Ensure we get suggestions if they finish after answer
-            if not suggestions_sent:
+        tail_parts = []
+        held = deque()  # (frame, token) not yet released to the client
+        held_chars = 0
+        in_tail = False
+        answer_stream = await self.llm.generate_answer(
+            query, context, sources, stream=True, raw=True, with_suggestions=True
+        )
+        async for line in answer_stream:
+            fast = _extract_response_fast(line) if FAST_TOKEN_SCAN else None
+            if fast is not None:
+                token, done = fast
+            else:
                 try:
-                    suggestions = suggestion_future.result()
-                    yield {"type": "suggestions", "data": suggestions}
-                except Exception as e:
-                    print(f"Error getting suggestions: {e}")
-            
-            executor.shutdown(wait=False)
-        
+                    data = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue
+                token = data.get("response")
+                done = data.get("done", False)
+            if token:
+                if in_tail:
+                    tail_parts.append(token)
+                else:
+                    held.append((line, token))
+                    held_chars += len(token)
+                    held_text = "".join(t for _, t in held)
+                    idx = held_text.find(marker)
+                    if idx != -1:
+                        in_tail = True
+                        tail_parts.append(held_text[idx + len(marker):])
+                        held.clear()
+                        held_chars = 0
+                        # The marker can split a frame, so re-frame the
+                        # remaining visible text ourselves
+                        visible = held_text[:idx].rstrip()
+                        if visible:
+                            answer_parts.append(visible)
+                            yield orjson.dumps({"response": visible, "done": False})
+                    else:
+                        while held and held_chars - len(held[0][1]) >= len(marker):
+                            frame, tok = held.popleft()
+                            held_chars -= len(tok)
+                            answer_parts.append(tok)
+                            yield frame
+            if done:
+                break
+
+        # Stream ended without a marker: flush the holdback window
+        for frame, tok in held:
+            answer_parts.append(tok)
+            yield frame
+
+        suggestions = self._parse_suggestion_tail("".join(tail_parts))
+        if not suggestions:
+            # Model ignored the instruction; fall back to a separate call
+            suggestions = await self.llm.generate_suggestions(query)
+
         # Cache result
         full_answer = "".join(answer_parts)
         cache_data = {
             "answer": full_answer,
             "sources": sources,
-            "query": query
+            "query": query,
+            "suggestions": suggestions
         }
-        self.cache.set_query_result(query, cache_data)
-        
+        self.cache.set_query_result(query, cache_data, key=cache_key)
+
         yield {"type": "complete", "data": {"answer": full_answer, "sources": sources, "suggestions": suggestions}}
@@ -3,11 +3,43 @@ RAG (Retrieval-Augmented Generation) pipeline with FAISS vector search.
 Handles text chunking, embedding generation, and semantic retrieval.
 """
 
+import asyncio
+import functools
+import io
+import re
 import numpy as np
-from typing import List, Dict, Tuple
+import xxhash
+from typing import AsyncIterator, List, Dict, Tuple
 from sentence_transformers import SentenceTransformer
 import faiss
 
+# Sentence boundaries used when splitting text into chunks
+_BOUNDARY_RE = re.compile(r'[.\n]')
+
+@functools.lru_cache(maxsize=4)
+def _load_model(model_name: str) -> SentenceTransformer:
+    """
+    Load a SentenceTransformer once per model name.
+
+    Each load pulls hundreds of MB of weights; caching lets multiple
+    RAGPipeline (and orchestrator) instances share one model. encode()
+    is thread-safe for inference, so sharing is safe.
+
+    Prefers the ONNX Runtime backend with the int8-quantized export
+    (int8 GEMM via VNNI on AVX-512 CPUs, roughly 2-4x the PyTorch
+    throughput); falls back to the default PyTorch backend when ORT or
+    the quantized export is unavailable.
+    """
+    try:
+        return SentenceTransformer(
+            model_name,
+            backend="onnx",
+            model_kwargs={"file_name": "onnx/model_qint8_avx512_vnni.onnx"}
+        )
+    except Exception as e:
+        print(f"ONNX backend unavailable for {model_name} ({e}), using PyTorch")
+        return SentenceTransformer(model_name)
+
 class RAGPipeline:
     def __init__(self, model_name: str = "all-MiniLM-L6-v2", chunk_size: int = 500, chunk_overlap: int = 50):
         """
@@ -18,10 +50,17 @@ class RAGPipeline:
             chunk_size: Size of text chunks in characters
             chunk_overlap: Overlap between chunks in characters
         """
-        self.model = SentenceTransformer(model_name)
+        self.model = _load_model(model_name)
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
         self.dimension = 384  # Dimension for all-MiniLM-L6-v2
+
+        # Warm up lazy one-time costs (tokenizer setup, BLAS/MKL thread
+        # init, kernel selection) so they don't land on the first query
+        self.model.encode(["warmup", "warmup"], show_progress_bar=False)
+        warm = faiss.IndexFlatIP(self.dimension)
+        warm.add(np.zeros((2, self.dimension), dtype=np.float32))
+        warm.search(np.zeros((1, self.dimension), dtype=np.float32), 1)
     
     def chunk_text(self, text: str) -> List[str]:
         """
@@ -35,27 +74,31 @@ class RAGPipeline:
         """
         if not text or len(text) == 0:
             return []
-        
+
+        # Collect all boundary positions in one C-level pass, then binary
+        # search per chunk, instead of two Python rfind scans per chunk
+        bpos = np.fromiter(
+            (m.start() for m in _BOUNDARY_RE.finditer(text)), dtype=np.int64
+        )
+
         chunks = []
         start = 0
-        
+
         while start < len(text):
             end = start + self.chunk_size
-            chunk = text[start:end]
-            
+
             # Try to break at sentence boundary
-            if end < len(text):
-                last_period = chunk.rfind('.')
-                last_newline = chunk.rfind('\n')
-                break_point = max(last_period, last_newline)
-                
-                if break_point > self.chunk_size * 0.5:  # Only break if we're past halfway
-                    chunk = chunk[:break_point + 1]
-                    end = start + break_point + 1
-            
-            chunks.append(chunk.strip())
+            if end < len(text) and bpos.size:
+                # Last boundary before `end` (same result as rfind on the chunk)
+                i = int(np.searchsorted(bpos, end)) - 1
+                if i >= 0 and bpos[i] >= start:
+                    break_point = int(bpos[i]) - start
+                    if break_point > self.chunk_size * 0.5:  # Only break if we're past halfway
+                        end = start + break_point + 1
+
+            chunks.append(text[start:end].strip())
             start = end - self.chunk_overlap
-        
+
         return [c for c in chunks if len(c) > 50]  # Filter out very small chunks
     
     def generate_embeddings(self, texts: List[str]) -> np.ndarray:
@@ -71,10 +114,14 @@ class RAGPipeline:
         if not texts:
             return np.array([])
         
-        embeddings = self.model.encode(texts, show_progress_bar=False)
-        return embeddings
+        # convert_to_numpy + copy=False: hand FAISS an already-float32
+        # contiguous buffer instead of copying the matrix per query
+        embeddings = self.model.encode(
+            texts, show_progress_bar=False, convert_to_numpy=True, normalize_embeddings=True
+        )
+        return embeddings.astype(np.float32, copy=False)
     
-    def create_vector_store(self, chunks: List[str]) -> Tuple[faiss.IndexFlatL2, List[str]]:
+    def create_vector_store(self, chunks: List[str]) -> Tuple[faiss.Index, List[str]]:
         """
         Create FAISS vector store from text chunks.
         
@@ -86,17 +133,52 @@ class RAGPipeline:
         """
         if not chunks:
             return None, []
-        
+
         # Generate embeddings
         embeddings = self.generate_embeddings(chunks)
-        
-        # Create FAISS index
-        index = faiss.IndexFlatL2(self.dimension)
-        index.add(embeddings.astype('float32'))
-        
+
+        return self.create_vector_store_from_embeddings(embeddings, chunks)
+
+    def create_vector_store_from_embeddings(self, embeddings: np.ndarray, chunks: List[str]) -> Tuple[faiss.Index, List[str]]:
+        """
+        Create FAISS vector store from precomputed embeddings.
+
+        Args:
+            embeddings: Embeddings matrix aligned with chunks
+            chunks: List of text chunks
+
+        Returns:
+            Tuple of (FAISS index, chunks list)
+        """
+        if not chunks:
+            return None, []
+
+        # copy=False: encode(convert_to_numpy=True) already yields float32
+        embeddings = embeddings.astype('float32', copy=False)
+        if len(chunks) < 256:
+            # Small corpora (the common case: a handful of web pages):
+            # skip FAISS entirely and keep the raw matrix — one dot
+            # product + argpartition at query time beats building,
+            # training and scanning an index
+            return embeddings, chunks
+        if len(chunks) >= 500:
+            # Large chunk sets: HNSW graph search is sub-linear in the
+            # number of vectors, vs. brute force scanning all of them
+            index = faiss.IndexHNSWFlat(self.dimension, 32, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = 80
+        else:
+            # Brute-force inner product (== cosine over normalized vectors),
+            # stored as fp16: half the bytes scanned per query, and the loss
+            # is negligible for unit-norm MiniLM embeddings
+            index = faiss.IndexScalarQuantizer(
+                self.dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT
+            )
+            index.train(embeddings)
+        index.add(embeddings)
+
         return index, chunks
     
-    def search_similar(self, index: faiss.IndexFlatL2, chunks: List[str], query: str, top_k: int = 5) -> List[Dict[str, any]]:
+    def search_similar(self, index: faiss.Index, chunks: List[str], query: str, top_k: int = 5) -> List[Dict[str, any]]:
         """
         Search for similar chunks to the query.
         
@@ -109,29 +191,72 @@ class RAGPipeline:
         Returns:
             List of dicts with chunk, score, and index
         """
-        if not index or not chunks:
+        if index is None or not chunks:
             return []
-        
-        # Embed the query
-        query_embedding = self.model.encode([query])[0]
-        
-        # Search in FAISS
-        distances, indices = index.search(
-            query_embedding.reshape(1, -1).astype('float32'), 
-            min(top_k, len(chunks))
-        )
-        
+
+        # Embed the query (normalized, matching the indexed vectors)
+        query_embedding = self.model.encode([query], normalize_embeddings=True)[0]
+
+        return self.search_similar_with_embedding(index, chunks, query_embedding, top_k)
+
+    def search_similar_with_embedding(self, index: faiss.Index, chunks: List[str], query_embedding: np.ndarray, top_k: int = 5) -> List[Dict[str, any]]:
+        """
+        Search for similar chunks using a precomputed query embedding.
+
+        Args:
+            index: FAISS index
+            chunks: List of text chunks
+            query_embedding: Precomputed embedding of the query
+            top_k: Number of top results to return
+
+        Returns:
+            List of dicts with chunk, score, and index
+        """
+        if index is None or not chunks:
+            return []
+
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+
+        if isinstance(index, np.ndarray):
+            # Raw-matrix path for small corpora (see
+            # create_vector_store_from_embeddings): partial top-k select
+            # instead of a full sort
+            scores = index @ query_vector
+            k = min(top_k, len(chunks))
+            if k < len(scores):
+                top = np.argpartition(-scores, k)[:k]
+            else:
+                top = np.arange(len(scores))
+            top = top[np.argsort(-scores[top])]
+            return [
+                {
+                    "chunk": chunks[int(idx)],
+                    "score": float(scores[idx]),  # cosine similarity
+                    "rank": i + 1,
+                    "index": int(idx)
+                }
+                for i, idx in enumerate(top)
+            ]
+
+        if isinstance(index, faiss.IndexHNSWFlat):
+            # Widen the candidate beam for recall; still far fewer
+            # distance computations than a flat scan
+            index.hnsw.efSearch = max(64, top_k * 4)
+
+        # Search in FAISS (asarray: no copy when already float32)
+        distances, indices = index.search(query_vector.reshape(1, -1), min(top_k, len(chunks)))
+
         # Format results
         results = []
         for i, (distance, idx) in enumerate(zip(distances[0], indices[0])):
             if idx < len(chunks):  # Ensure valid index
                 results.append({
                     "chunk": chunks[idx],
-                    "score": float(distance),
+                    "score": float(distance),  # cosine similarity
                     "rank": i + 1,
                     "index": int(idx)
                 })
-        
+
         return results
     
     def process_documents(self, documents: List[Dict[str, str]], query: str, top_k: int = 5) -> Dict[str, any]:
@@ -178,12 +303,34 @@ class RAGPipeline:
                 "total_chunks": 0,
                 "sources": []
             }
-        
-        # Create vector store
-        index, chunks = self.create_vector_store(all_chunks)
-        
+
+        # Embed each distinct chunk once: boilerplate repeated across
+        # pages (navigation, footers) otherwise wastes encoder cycles
+        # and bloats the index. First occurrence's source is kept.
+        seen = {}
+        unique_chunks = []
+        unique_sources = []
+        for chunk, source in zip(all_chunks, chunk_sources):
+            h = xxhash.xxh3_64_intdigest(chunk)
+            if h not in seen:
+                seen[h] = len(unique_chunks)
+                unique_chunks.append(chunk)
+                unique_sources.append(source)
+        chunk_sources = unique_sources
+
+        # Embed query and chunks in one batched encode: saves a second
+        # transformer invocation and runs the GEMM over a wider matrix
+        embeddings = self.model.encode(
+            [query] + unique_chunks,
+            batch_size=64,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
+        index, chunks = self.create_vector_store_from_embeddings(embeddings[1:], unique_chunks)
+
         # Search for relevant chunks
-        results = self.search_similar(index, chunks, query, top_k)
+        results = self.search_similar_with_embedding(index, chunks, embeddings[0], top_k)
         
         # Add source information to results
         for result in results:
@@ -201,6 +348,88 @@ class RAGPipeline:
             "query": query
         }
     
+    async def process_documents_stream(self, documents: AsyncIterator[Dict[str, str]], query: str, top_k: int = 5, executor=None) -> Dict[str, any]:
+        """
+        Process documents arriving from an async iterator, overlapping
+        embedding with document arrival.
+
+        Each document's chunks are submitted for encoding as soon as the
+        page is yielded, so embedding runs behind the remaining fetches
+        instead of starting after the slowest one.
+
+        Args:
+            documents: Async iterator of dicts with 'content' and 'url'
+                       (e.g. SearchLayer.iter_contents)
+            query: Search query
+            top_k: Number of top chunks to retrieve
+            executor: Executor for the encode calls (None = default pool)
+
+        Returns:
+            Dict with retrieved chunks and metadata (same shape as
+            process_documents)
+        """
+        loop = asyncio.get_running_loop()
+        encode = functools.partial(
+            self.model.encode,
+            batch_size=64,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
+
+        # Kick off the query embedding immediately; it only depends on
+        # the query
+        embed_futures = [loop.run_in_executor(executor, encode, [query])]
+
+        all_chunks = []
+        chunk_sources = []  # Track which document each chunk came from
+        collected_docs = []
+
+        async for doc in documents:
+            collected_docs.append(doc)
+            doc_chunks = self.chunk_text(doc.get("content", ""))
+            if not doc_chunks:
+                continue
+
+            all_chunks.extend(doc_chunks)
+            for _ in doc_chunks:
+                chunk_sources.append({
+                    "url": doc.get("url", ""),
+                    "domain": doc.get("domain", "")
+                })
+
+            embed_futures.append(loop.run_in_executor(executor, encode, doc_chunks))
+
+        if not all_chunks:
+            return {
+                "chunks": [],
+                "total_chunks": 0,
+                "sources": []
+            }
+
+        parts = await asyncio.gather(*embed_futures)
+        query_embedding = parts[0][0]
+        embeddings = np.vstack(parts[1:])
+
+        index, chunks = self.create_vector_store_from_embeddings(embeddings, all_chunks)
+        results = self.search_similar_with_embedding(index, chunks, query_embedding, top_k)
+
+        # Add source information to results
+        for result in results:
+            chunk_idx = result["index"]
+            if chunk_idx < len(chunk_sources):
+                result["source"] = chunk_sources[chunk_idx]
+
+        # Get unique sources
+        unique_sources = list({doc["url"]: doc for doc in collected_docs}.values())
+
+        return {
+            "chunks": results,
+            "total_chunks": len(all_chunks),
+            "sources": unique_sources,
+            "query": query
+        }
+
     def format_context(self, rag_results: Dict[str, any], max_chunks: int = 5) -> str:
         """
         Format RAG results into context string for LLM.
@@ -213,17 +442,21 @@ class RAGPipeline:
             Formatted context string
         """
         chunks = rag_results.get("chunks", [])[:max_chunks]
-        
+
         if not chunks:
             return ""
-        
-        context_parts = []
+
+        # Per-chunk character budget keeps the total context bounded, so
+        # LLM prompt size (and latency) stays stable regardless of how
+        # long individual chunks came out
+        budget = 8000 // max_chunks
+
+        buf = io.StringIO()
         for i, chunk_data in enumerate(chunks, 1):
             chunk = chunk_data["chunk"]
             source = chunk_data.get("source", {})
-            url = source.get("url", "Unknown")
             domain = source.get("domain", "Unknown")
-            
-            context_parts.append(f"[Source {i} - {domain}]\n{chunk}\n")
-        
-        return "\n".join(context_parts)
+
+            buf.write(f"[Source {i} - {domain}]\n{chunk[:budget]}\n\n")
+
+        return buf.getvalue()
@@ -4,20 +4,176 @@ Performs parallel fetching and HTML parsing for speed.
 """
 
 import asyncio
+import hashlib
+import os
+import random
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict
+from dataclasses import dataclass, asdict
 import aiohttp
+from cachetools import TTLCache
 from typing import List, Dict, Optional
 from duckduckgo_search import DDGS
 from bs4 import BeautifulSoup
-import html2text
+from lxml import html as lxml_html
+from lxml.cssselect import CSSSelector
+try:
+    # Lexbor parses HTML in C, roughly an order of magnitude faster than
+    # building a BS4 tree; BS4 below stays as the fallback
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+try:
+    # libuv-based loop for the background fetch thread; the app's own
+    # loop already runs uvloop via uvicorn's loop="uvloop" setting
+    import uvloop
+except ImportError:
+    uvloop = None
 import re
-from urllib.parse import urlparse
+from urllib.parse import urlencode, urlsplit, urlunsplit, parse_qsl, quote
 import wikipedia
 from googlesearch import search as google_search
-import nest_asyncio
-import requests
 
-# Apply nest_asyncio
-nest_asyncio.apply()
+# _clean_text helpers, compiled/built once at import instead of per call
+_RE_BLANKLINES = re.compile(r'\n\s*\n')
+_RE_SPACES = re.compile(r' +')
+_RE_DISALLOWED = re.compile(r"[^\w\s\.\,\!\?\;\:\-\'\"\(\)]")
+# str.translate deletes disallowed ASCII in one C-level pass; the regex
+# above then only has to mop up non-ASCII symbols
+_ALLOWED_PUNCT = ".,!?;:-'\"()"
+_TRANS = {
+    c: None for c in range(128)
+    if not (chr(c).isalnum() or chr(c) == '_' or chr(c).isspace() or chr(c) in _ALLOWED_PUNCT)
+}
+
+@dataclass(slots=True)
+class SearchHit:
+    """One provider search result; internal record, dict at API edges."""
+    title: str
+    url: str
+    snippet: str
+
+@dataclass(slots=True)
+class PageContent:
+    """One extracted page; internal record, dict at API edges."""
+    url: str
+    content: str
+    domain: str
+
+# URLs skipped before fetching: binary/media extensions that won't parse
+# as HTML, and hosts that serve login walls or script-rendered shells
+_SKIP_EXT = ('.pdf', '.zip', '.mp4', '.mp3', '.jpg', '.jpeg', '.png', '.gif', '.svg')
+_SKIP_HOST = {
+    'youtube.com', 'twitter.com', 'x.com', 'facebook.com',
+    'instagram.com', 'tiktok.com',
+}
+
+def _should_fetch(url: str) -> bool:
+    """Cheap pre-filter: skip URLs that can't yield useful HTML text."""
+    low = url.lower()
+    if low.endswith(_SKIP_EXT):
+        return False
+    host = urlsplit(low).netloc
+    if host.startswith('www.'):
+        host = host[4:]
+    return host not in _SKIP_HOST
+
+def _canon(url: str) -> str:
+    """
+    Canonical form of a URL for de-duplication: lowercased scheme and
+    host, fragment dropped, tracking (utm_*) query params stripped.
+    Providers often return the same page under several tracking URLs.
+    """
+    try:
+        s = urlsplit(url)
+    except ValueError:
+        return url
+    q = [(k, v) for k, v in parse_qsl(s.query) if not k.startswith('utm_')]
+    return urlunsplit((s.scheme.lower(), s.netloc.lower(), s.path, urlencode(q), ''))
+
+# Selector strings shared by both parser branches, plus precompiled
+# CSS->XPath evaluators for the lxml fallback (CSSSelector translates
+# once at import; passing strings would redo the translation per call)
+_SEL_STRIP = 'script,style,nav,footer,header'
+_SEL_MAIN = 'article, main, div[role="main"]'
+_SEL_BING_ROW = '.b_algo'
+_SEL_BING_TITLE = 'h2 a'
+_SEL_BING_SNIPPET = '.b_caption p'
+_SEL_BRAVE_ROW = '.snippet'
+_SEL_BRAVE_TITLE = '.snippet-title'
+_SEL_BRAVE_URL = '.snippet-url'
+_SEL_BRAVE_SNIPPET = '.snippet-description'
+
+_X_BING_ROW = CSSSelector(_SEL_BING_ROW)
+_X_BING_TITLE = CSSSelector(_SEL_BING_TITLE)
+_X_BING_SNIPPET = CSSSelector(_SEL_BING_SNIPPET)
+_X_BRAVE_ROW = CSSSelector(_SEL_BRAVE_ROW)
+_X_BRAVE_TITLE = CSSSelector(_SEL_BRAVE_TITLE)
+_X_BRAVE_URL = CSSSelector(_SEL_BRAVE_URL)
+_X_BRAVE_SNIPPET = CSSSelector(_SEL_BRAVE_SNIPPET)
+
+# Transient statuses worth retrying on an idempotent GET
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Browser-like header for the scraped providers (Bing, Brave)
+_BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+def _clean_text(text: str) -> str:
+    """Clean and normalize extracted text."""
+    text = _RE_BLANKLINES.sub('\n\n', text)
+    text = _RE_SPACES.sub(' ', text)
+    text = _RE_DISALLOWED.sub('', text.translate(_TRANS))
+    return text.strip()
+
+def _extract_main_text(html: bytes, max_content_length: int) -> str:
+    """
+    Extract, clean and truncate the main content of an HTML page.
+
+    Top-level (picklable) so it can run in the extraction process pool.
+    """
+    try:
+        if LexborHTMLParser is not None:
+            tree = LexborHTMLParser(html)
+            for node in tree.css(_SEL_STRIP):
+                node.decompose()
+
+            # One selector-union scan instead of three sequential
+            # full-tree css_first calls; body stays a separate
+            # fallback since it would otherwise win on document order
+            main_content = (
+                tree.css_first(_SEL_MAIN)
+                or tree.body
+            )
+            if main_content is None:
+                return ""
+            # Pull text straight off the parsed tree — serializing
+            # back to HTML and re-parsing through html2text was a
+            # second full parse per page
+            text = main_content.text(separator='\n', strip=True)
+        else:
+            soup = BeautifulSoup(html, 'lxml')
+            for script in soup(["script", "style", "nav", "footer", "header"]):
+                script.decompose()
+
+            main_content = (
+                soup.select_one(_SEL_MAIN)
+                or soup.body
+            )
+            if not main_content:
+                return ""
+            text = main_content.get_text('\n', strip=True)
+
+        text = _clean_text(text)
+
+        if len(text) > max_content_length:
+            text = text[:max_content_length] + "..."
+        return text
+    except Exception as e:
+        print(f"Error extracting content: {e}")
+        return ""
 
 class SearchLayer:
     def __init__(self, max_results: int = 10, max_content_length: int = 5000):
@@ -30,9 +186,105 @@ class SearchLayer:
         """
         self.max_results = max_results
         self.max_content_length = max_content_length
-        self.html_converter = html2text.HTML2Text()
-        self.html_converter.ignore_links = False
-        self.html_converter.ignore_images = True
+
+        # Lazily-created persistent HTTP sessions (see _get_session) and
+        # fetch-concurrency limits (see _get_fetch_limits); both are
+        # loop-bound objects and so are cached per event loop
+        self._sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+        self._fetch_limits: Dict[asyncio.AbstractEventLoop, tuple] = {}
+
+        # Process pool for the CPU-bound HTML extraction; created on
+        # first use so importing the module stays cheap
+        self._extract_pool: Optional[ProcessPoolExecutor] = None
+
+        # Exact-match memoization: a repeated provider query within the
+        # TTL skips the network round-trip, and an identical HTML payload
+        # skips the parse. search() runs on worker threads, so access is
+        # lock-guarded (TTLCache is not thread-safe).
+        self._search_memo = TTLCache(maxsize=512, ttl=600)
+        self._extract_memo = TTLCache(maxsize=2048, ttl=3600)
+        self._memo_lock = threading.Lock()
+
+        # Dedicated event loop on a daemon thread. Sync entry points
+        # submit coroutines to it via run_coroutine_threadsafe, so the
+        # shared aiohttp session (and its keep-alive connections) lives
+        # on one loop for the process lifetime instead of being torn
+        # down with each caller's temporary loop.
+        self._loop = uvloop.new_event_loop() if uvloop is not None else asyncio.new_event_loop()
+        threading.Thread(
+            target=self._loop.run_forever, name="search-io", daemon=True
+        ).start()
+
+    def _get_fetch_limits(self):
+        """
+        Return (global semaphore, per-host semaphore map) for the
+        running loop.
+
+        The global cap keeps big result sets from exhausting the
+        connector; the per-host cap (4) stops several URLs on one slow
+        host from monopolizing the pool while the rest of the fan-out
+        waits. Semaphores bind to the loop that first awaits them, so
+        like sessions they are kept per loop.
+        """
+        loop = asyncio.get_running_loop()
+        limits = self._fetch_limits.get(loop)
+        if limits is None:
+            limits = (
+                asyncio.Semaphore(16),
+                defaultdict(lambda: asyncio.Semaphore(4)),
+            )
+            self._fetch_limits[loop] = limits
+        return limits
+
+    def _get_extract_pool(self) -> ProcessPoolExecutor:
+        """Return the extraction process pool, creating it lazily."""
+        with self._memo_lock:
+            if self._extract_pool is None:
+                self._extract_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+            return self._extract_pool
+
+    def _run_async(self, coro, timeout: float = 30):
+        """Run a coroutine on the background loop from sync code."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout=timeout)
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Return the shared ClientSession for the running loop, creating
+        it on first use.
+
+        A long-lived session with a bounded TCPConnector keeps TCP/TLS
+        connections alive across fetches and queries, skipping a
+        handshake round-trip per HTTPS URL; per-call sessions would
+        reconnect every time. aiohttp sessions are bound to the loop
+        that created them, so they are cached per loop (in practice the
+        app's loop and the background loop).
+        """
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=64, limit_per_host=8, ttl_dns_cache=300
+                ),
+                timeout=aiohttp.ClientTimeout(total=10)
+            )
+            self._sessions[loop] = session
+        return session
+
+    async def close(self) -> None:
+        """Close shared HTTP sessions and stop the background loop."""
+        current = asyncio.get_running_loop()
+        for loop, session in list(self._sessions.items()):
+            if session.closed:
+                continue
+            if loop is current:
+                await session.close()
+            else:
+                asyncio.run_coroutine_threadsafe(session.close(), loop).result(timeout=5)
+        self._sessions.clear()
+        if self._extract_pool is not None:
+            self._extract_pool.shutdown(wait=False)
+        self._loop.call_soon_threadsafe(self._loop.stop)
     
     def search(self, query: str, provider: str = "duckduckgo") -> List[Dict[str, str]]:
         """
@@ -46,209 +298,324 @@ class SearchLayer:
             List of search results with title, url, and snippet
         """
         print(f"  → Searching with {provider}...")
-        
+
+        memo_key = (provider, query.lower().strip())
+        with self._memo_lock:
+            memoized = self._search_memo.get(memo_key)
+        if memoized is not None:
+            return memoized
+
         if provider == "wikipedia":
-            return self._search_wikipedia(query)
+            results = self._search_wikipedia(query)
         elif provider == "google":
-            return self._search_google(query)
+            results = self._search_google(query)
         elif provider == "bing":
-            return self._search_bing(query)
+            results = self._search_bing(query)
         elif provider == "brave":
-            return self._search_brave(query)
+            results = self._search_brave(query)
         else:
-            return self._search_duckduckgo(query)
+            results = self._search_duckduckgo(query)
+
+        # Providers build slotted SearchHit records; callers (and the
+        # memo) see plain dicts, the shape the JSON edges expect
+        results = [asdict(hit) for hit in results]
+
+        if results:
+            with self._memo_lock:
+                self._search_memo[memo_key] = results
+        return results
 
-    def _search_duckduckgo(self, query: str) -> List[Dict[str, str]]:
+    def _search_duckduckgo(self, query: str) -> List[SearchHit]:
         """Search using DuckDuckGo."""
         try:
             with DDGS() as ddgs:
                 results = list(ddgs.text(query, max_results=self.max_results))
                 
-                formatted_results = []
-                for result in results:
-                    formatted_results.append({
-                        "title": result.get("title", ""),
-                        "url": result.get("href", ""),
-                        "snippet": result.get("body", "")
-                    })
-                return formatted_results
+                return [
+                    SearchHit(
+                        title=result.get("title", ""),
+                        url=result.get("href", ""),
+                        snippet=result.get("body", "")
+                    )
+                    for result in results
+                ]
         except Exception as e:
             print(f"DuckDuckGo search error: {e}")
             return []
 
+    async def _wiki_summary(self, session: aiohttp.ClientSession, title: str) -> Optional[SearchHit]:
+        """Fetch one page summary from the MediaWiki REST API."""
+        url = f"https://en.wikipedia.org/api/rest_v1/page/summary/{quote(title)}"
+        try:
+            async with session.get(url, headers={"Accept": "application/json"}) as response:
+                if response.status != 200:
+                    return None
+                data = await response.json()
+        except Exception:
+            return None
+
+        if data.get("type") == "disambiguation":
+            return None
+
+        return SearchHit(
+            title=data.get("title", title),
+            url=data.get("content_urls", {}).get("desktop", {}).get(
+                "page", f"https://en.wikipedia.org/wiki/{quote(title)}"
+            ),
+            snippet=(data.get("extract") or "")[:200] + "..."
+        )
+
+    async def _fetch_wiki_summaries(self, titles: List[str]) -> List[SearchHit]:
+        """Fetch all title summaries concurrently."""
+        session = await self._get_session()
+        pages = await asyncio.gather(*(self._wiki_summary(session, t) for t in titles))
+        return [p for p in pages if p]
+
     def _search_wikipedia(self, query: str) -> List[Dict[str, str]]:
-        """Search using Wikipedia API."""
+        """Search using Wikipedia's REST API (parallel summary fetches)."""
         try:
-            results = wikipedia.search(query, results=self.max_results)
-            formatted_results = []
-            
-            for title in results:
-                try:
-                    page = wikipedia.page(title, auto_suggest=False)
-                    formatted_results.append({
-                        "title": page.title,
-                        "url": page.url,
-                        "snippet": page.summary[:200] + "..."
-                    })
-                except (wikipedia.DisambiguationError, wikipedia.PageError):
-                    continue
-                    
-            return formatted_results
+            titles = wikipedia.search(query, results=self.max_results)
+            if not titles:
+                return []
+            # One REST summary call per title, overlapped, instead of N
+            # sequential wikipedia.page() round-trips (each of which
+            # pulled the full article just to slice 200 chars)
+            return self._run_async(self._fetch_wiki_summaries(titles))
         except Exception as e:
             print(f"Wikipedia search error: {e}")
             return []
 
-    def _search_google(self, query: str) -> List[Dict[str, str]]:
+    def _search_google(self, query: str) -> List[SearchHit]:
         """Search using Google (via googlesearch-python)."""
         try:
             # Note: googlesearch-python only returns URLs, so we'll have to fetch titles/snippets later
             # or just use the URL as title for now
             results = list(google_search(query, num_results=self.max_results, advanced=True))
             
-            formatted_results = []
-            for result in results:
-                formatted_results.append({
-                    "title": result.title,
-                    "url": result.url,
-                    "snippet": result.description
-                })
-            return formatted_results
+            return [
+                SearchHit(title=result.title, url=result.url, snippet=result.description)
+                for result in results
+            ]
         except Exception as e:
             print(f"Google search error: {e}")
             return []
     
-    def _search_bing(self, query: str) -> List[Dict[str, str]]:
-        """Search using Bing."""
-        try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            url = f"https://www.bing.com/search?q={query.replace(' ', '+')}"
-            response = requests.get(url, headers=headers, timeout=10)
-            soup = BeautifulSoup(response.text, 'lxml')
-            
-            formatted_results = []
-            results = soup.select('.b_algo')[:self.max_results]
-            
-            for result in results:
-                title_elem = result.select_one('h2 a')
-                snippet_elem = result.select_one('.b_caption p')
-                
+    def _parse_bing_results(self, html: str) -> List[SearchHit]:
+        """Parse a Bing results page into result dicts."""
+        formatted_results = []
+        if LexborHTMLParser is not None:
+            tree = LexborHTMLParser(html)
+            for result in tree.css(_SEL_BING_ROW)[:self.max_results]:
+                title_elem = result.css_first(_SEL_BING_TITLE)
+                snippet_elem = result.css_first(_SEL_BING_SNIPPET)
+
                 if title_elem:
-                    formatted_results.append({
-                        "title": title_elem.get_text(strip=True),
-                        "url": title_elem.get('href', ''),
-                        "snippet": snippet_elem.get_text(strip=True) if snippet_elem else ""
-                    })
-            
-            return formatted_results
+                    formatted_results.append(SearchHit(
+                        title=title_elem.text(strip=True),
+                        url=title_elem.attributes.get('href') or '',
+                        snippet=snippet_elem.text(strip=True) if snippet_elem else ""
+                    ))
+        else:
+            doc = lxml_html.fromstring(html)
+            for result in _X_BING_ROW(doc)[:self.max_results]:
+                title_elems = _X_BING_TITLE(result)
+                snippet_elems = _X_BING_SNIPPET(result)
+
+                if title_elems:
+                    formatted_results.append(SearchHit(
+                        title=title_elems[0].text_content().strip(),
+                        url=title_elems[0].get('href', ''),
+                        snippet=snippet_elems[0].text_content().strip() if snippet_elems else ""
+                    ))
+
+        return formatted_results
+
+    def _search_bing(self, query: str) -> List[SearchHit]:
+        """Search using Bing (fetched on the background loop)."""
+        try:
+            return self._run_async(self._search_bing_async(query))
         except Exception as e:
             print(f"Bing search error: {e}")
             return []
-    
-    def _search_brave(self, query: str) -> List[Dict[str, str]]:
-        """Search using Brave Search."""
+
+    async def _search_bing_async(self, query: str) -> List[SearchHit]:
+        """Search using Bing over the shared aiohttp session."""
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            url = f"https://search.brave.com/search?q={query.replace(' ', '+')}"
-            response = requests.get(url, headers=headers, timeout=10)
-            soup = BeautifulSoup(response.text, 'lxml')
-            
-            formatted_results = []
-            # Brave uses different selectors - adjust as needed
-            results = soup.select('.snippet')[:self.max_results]
-            
-            for result in results:
-                title_elem = result.select_one('.snippet-title')
-                url_elem = result.select_one('.snippet-url')
-                snippet_elem = result.select_one('.snippet-description')
-                
+            url = "https://www.bing.com/search?" + urlencode({'q': query})
+            session = await self._get_session()
+            async with session.get(url, headers=_BROWSER_HEADERS) as response:
+                html = await response.text()
+            return self._parse_bing_results(html)
+        except Exception as e:
+            print(f"Bing search error: {e}")
+            return []
+
+    def _parse_brave_results(self, html: str) -> List[SearchHit]:
+        """Parse a Brave results page into result dicts."""
+        formatted_results = []
+        # Brave uses different selectors - adjust as needed
+        if LexborHTMLParser is not None:
+            tree = LexborHTMLParser(html)
+            for result in tree.css(_SEL_BRAVE_ROW)[:self.max_results]:
+                title_elem = result.css_first(_SEL_BRAVE_TITLE)
+                url_elem = result.css_first(_SEL_BRAVE_URL)
+                snippet_elem = result.css_first(_SEL_BRAVE_SNIPPET)
+
                 if title_elem:
-                    formatted_results.append({
-                        "title": title_elem.get_text(strip=True),
-                        "url": url_elem.get('href', '') if url_elem else '',
-                        "snippet": snippet_elem.get_text(strip=True) if snippet_elem else ""
-                    })
-            
-            return formatted_results
+                    formatted_results.append(SearchHit(
+                        title=title_elem.text(strip=True),
+                        url=(url_elem.attributes.get('href') or '') if url_elem else '',
+                        snippet=snippet_elem.text(strip=True) if snippet_elem else ""
+                    ))
+        else:
+            doc = lxml_html.fromstring(html)
+            for result in _X_BRAVE_ROW(doc)[:self.max_results]:
+                title_elems = _X_BRAVE_TITLE(result)
+                url_elems = _X_BRAVE_URL(result)
+                snippet_elems = _X_BRAVE_SNIPPET(result)
+
+                if title_elems:
+                    formatted_results.append(SearchHit(
+                        title=title_elems[0].text_content().strip(),
+                        url=url_elems[0].get('href', '') if url_elems else '',
+                        snippet=snippet_elems[0].text_content().strip() if snippet_elems else ""
+                    ))
+
+        return formatted_results
+
+    def _search_brave(self, query: str) -> List[SearchHit]:
+        """Search using Brave Search (fetched on the background loop)."""
+        try:
+            return self._run_async(self._search_brave_async(query))
         except Exception as e:
             print(f"Brave search error: {e}")
             return []
-    
+
+    async def _search_brave_async(self, query: str) -> List[SearchHit]:
+        """Search using Brave Search over the shared aiohttp session."""
+        try:
+            url = "https://search.brave.com/search?" + urlencode({'q': query})
+            session = await self._get_session()
+            async with session.get(url, headers=_BROWSER_HEADERS) as response:
+                html = await response.text()
+            return self._parse_brave_results(html)
+        except Exception as e:
+            print(f"Brave search error: {e}")
+            return []
+
     async def fetch_url_content(self, session: aiohttp.ClientSession, url: str) -> Optional[str]:
         """Fetch and extract content from a URL asynchronously."""
         try:
-            async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                if response.status != 200:
+            sem, host_sems = self._get_fetch_limits()
+            async with sem, host_sems[urlsplit(url).netloc]:
+                raw = None
+                # Up to 3 attempts with jittered exponential backoff:
+                # a transient 5xx/429 or connection error would otherwise
+                # silently drop a source from the answer context
+                for attempt in range(3):
+                    if attempt:
+                        await asyncio.sleep(0.25 * (2 ** (attempt - 1)) + random.random() * 0.1)
+                    try:
+                        async with session.get(url) as response:
+                            if response.status in _RETRY_STATUSES:
+                                continue
+                            if response.status != 200:
+                                return None
+
+                            # Extraction keeps at most max_content_length
+                            # chars, so don't pull multi-MB pages (or
+                            # non-HTML payloads) into Python just to
+                            # throw them away
+                            content_type = response.headers.get('Content-Type', '')
+                            if content_type and not content_type.startswith('text/html'):
+                                return None
+                            content_length = response.headers.get('Content-Length')
+                            if content_length and int(content_length) > 2_000_000:
+                                return None
+
+                            raw = await response.content.read(524288)
+                            break
+                    except aiohttp.ClientError:
+                        continue
+                if raw is None:
                     return None
-                html = await response.text()
-                return self._extract_content(html, url)
+            # Hand the raw bytes straight to the parser: both lexbor and
+            # BS4 detect the encoding themselves, so decoding here would
+            # just materialize a second page-sized copy
+            return await self._extract_content(raw)
         except Exception as e:
             print(f"Error fetching {url}: {e}")
             return None
     
-    def _extract_content(self, html: str, url: str) -> str:
-        """Extract main content from HTML."""
+    async def _extract_content(self, html: bytes) -> str:
+        """
+        Extract main content from raw HTML bytes, off the event loop.
+
+        Parsing is the one CPU-bound stage of the fetch path (10-50ms
+        per page); running it inline would serialize the whole fan-out
+        behind the loop thread. Identical payloads are memoized before
+        touching the pool.
+        """
+        memo_key = hashlib.blake2b(html, digest_size=16).digest()
+        with self._memo_lock:
+            memoized = self._extract_memo.get(memo_key)
+        if memoized is not None:
+            return memoized
+
+        loop = asyncio.get_running_loop()
         try:
-            soup = BeautifulSoup(html, 'lxml')
-            for script in soup(["script", "style", "nav", "footer", "header"]):
-                script.decompose()
-            
-            main_content = None
-            for tag in ['article', 'main', 'div[role="main"]']:
-                main_content = soup.find(tag)
-                if main_content:
-                    break
-            
-            if not main_content:
-                main_content = soup.find('body')
-            
-            if not main_content:
-                return ""
-            
-            text = self.html_converter.handle(str(main_content))
-            text = self._clean_text(text)
-            
-            if len(text) > self.max_content_length:
-                text = text[:self.max_content_length] + "..."
-            
-            return text
+            text = await loop.run_in_executor(
+                self._get_extract_pool(), _extract_main_text, html, self.max_content_length
+            )
         except Exception as e:
             print(f"Error extracting content: {e}")
             return ""
+
+        if text:
+            with self._memo_lock:
+                self._extract_memo[memo_key] = text
+        return text
     
-    def _clean_text(self, text: str) -> str:
-        """Clean and normalize extracted text."""
-        text = re.sub(r'\n\s*\n', '\n\n', text)
-        text = re.sub(r' +', ' ', text)
-        text = re.sub(r'[^\w\s\.\,\!\?\;\:\-\'\"\(\)]', '', text)
-        return text.strip()
-    
+    async def iter_contents(self, urls: List[str]):
+        """
+        Fetch content from multiple URLs in parallel, yielding each page
+        as soon as it completes (completion order, not input order), so
+        downstream work can start before the slowest fetch finishes.
+        """
+        session = await self._get_session()
+
+        async def fetch(url: str):
+            return url, await self.fetch_url_content(session, url)
+
+        for task in asyncio.as_completed([fetch(url) for url in urls]):
+            url, content = await task
+            if content:
+                yield asdict(PageContent(url=url, content=content, domain=urlsplit(url).netloc))
+
     async def fetch_all_contents(self, urls: List[str]) -> List[Dict[str, str]]:
         """Fetch content from multiple URLs in parallel."""
-        async with aiohttp.ClientSession() as session:
-            tasks = [self.fetch_url_content(session, url) for url in urls]
-            contents = await asyncio.gather(*tasks)
-            
-            results = []
-            for url, content in zip(urls, contents):
-                if content:
-                    results.append({
-                        "url": url,
-                        "content": content,
-                        "domain": urlparse(url).netloc
-                    })
-            return results
+        session = await self._get_session()
+        tasks = [self.fetch_url_content(session, url) for url in urls]
+        contents = await asyncio.gather(*tasks)
+
+        return [
+            asdict(PageContent(url=url, content=content, domain=urlsplit(url).netloc))
+            for url, content in zip(urls, contents)
+            if content
+        ]
     
-    def search_and_extract(self, query: str, provider: str = "duckduckgo") -> Dict[str, any]:
+    def search_and_extract(self, query: str, provider: str = "duckduckgo",
+                           skip_fetch_if_snippet_chars: int = 2000) -> Dict[str, any]:
         """
         Perform search and extract content from results.
         
         Args:
             query: The search query
             provider: Search provider to use
+            skip_fetch_if_snippet_chars: When the combined provider
+                snippets reach this many characters, skip the page
+                fetch/parse phase and use the snippets as content
+                (0 disables the short-circuit)
             
         Returns:
             Dict with search results and extracted contents
@@ -262,19 +629,42 @@ class SearchLayer:
                 "search_results": [],
                 "extracted_contents": []
             }
+
+        # Short-circuit: when the snippets alone already carry enough
+        # text to answer from, the whole fetch + parse phase is wasted
+        # work — serve the snippets as the extracted content instead
+        if skip_fetch_if_snippet_chars:
+            snippet_chars = sum(len(r["snippet"]) for r in search_results)
+            if snippet_chars >= skip_fetch_if_snippet_chars:
+                return {
+                    "query": query,
+                    "search_results": search_results,
+                    "extracted_contents": [
+                        asdict(PageContent(
+                            url=r["url"],
+                            content=f"{r['title']}\n{r['snippet']}",
+                            domain=urlsplit(r["url"]).netloc
+                        ))
+                        for r in search_results if r["snippet"]
+                    ]
+                }
         
-        # Extract URLs
-        urls = [result["url"] for result in search_results]
+        # De-duplicate URLs on their canonical form before fanning out:
+        # every duplicate skipped is one fewer HTTP fetch + HTML parse
+        seen = set()
+        urls = []
+        for result in search_results:
+            if not _should_fetch(result["url"]):
+                continue
+            canon = _canon(result["url"])
+            if canon not in seen:
+                seen.add(canon)
+                urls.append(result["url"])
         
-        # Fetch contents asynchronously
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
+        # Fetch contents on the background loop; works from worker
+        # threads and from within another running loop alike
         try:
-            extracted_contents = loop.run_until_complete(self.fetch_all_contents(urls))
+            extracted_contents = self._run_async(self.fetch_all_contents(urls))
         except Exception as e:
             print(f"Error fetching contents: {e}")
             extracted_contents = []
@@ -10,6 +10,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     let socket = null;
     let currentAnswer = '';
+    const wsDecoder = new TextDecoder();
 
     // Event Listeners
     searchBtn.addEventListener('click', () => performSearch(searchInput.value));
@@ -49,6 +50,8 @@ document.addEventListener('DOMContentLoaded', () => {
         const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
         const wsUrl = `${protocol}//${window.location.host}/ws`;
         socket = new WebSocket(wsUrl);
+        // Server streams binary frames of JSON bytes (cheaper than text frames)
+        socket.binaryType = 'arraybuffer';
 
         socket.onopen = () => {
             loadingText.textContent = 'Connected. Sending query...';
@@ -60,7 +63,8 @@ document.addEventListener('DOMContentLoaded', () => {
         };
 
         socket.onmessage = (event) => {
-            const data = JSON.parse(event.data);
+            const raw = event.data instanceof ArrayBuffer ? wsDecoder.decode(event.data) : event.data;
+            const data = JSON.parse(raw);
             handleWebSocketMessage(data);
         };
 
@@ -76,6 +80,14 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     function handleWebSocketMessage(data) {
+        // Token frames are raw Ollama NDJSON passed through by the server
+        if (data.type === undefined) {
+            if (typeof data.response === 'string' && data.response.length > 0) {
+                appendAnswerToken(data.response);
+            }
+            return;
+        }
+
         switch (data.type) {
             case 'status':
                 loadingText.textContent = data.message;
@@ -100,16 +112,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 break;
 
             case 'token':
-                currentAnswer += data.data;
-                const answerContent = document.getElementById('answer-content');
-                if (answerContent) {
-                    // Simple markdown parsing for bold and code
-                    let formatted = currentAnswer
-                        .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>')
-                        .replace(/`(.*?)`/g, '<code>$1</code>')
-                        .replace(/\n/g, '<br>');
-                    answerContent.innerHTML = formatted;
-                }
+                appendAnswerToken(data.data);
                 break;
 
             case 'cached':
@@ -141,6 +144,19 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    function appendAnswerToken(token) {
+        currentAnswer += token;
+        const answerContent = document.getElementById('answer-content');
+        if (answerContent) {
+            // Simple markdown parsing for bold and code
+            let formatted = currentAnswer
+                .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>')
+                .replace(/`(.*?)`/g, '<code>$1</code>')
+                .replace(/\n/g, '<br>');
+            answerContent.innerHTML = formatted;
+        }
+    }
+
     function updateSuggestions(suggestions) {
         const suggestionsContainer = document.querySelector('.suggestions');
         if (!suggestionsContainer || !suggestions || suggestions.length === 0) return;
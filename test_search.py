@@ -1,3 +1,4 @@
+import asyncio
 import sys
 sys.path.insert(0, 'backend')
 
@@ -7,7 +8,7 @@ print("Initializing orchestrator...")
 orch = SearchOrchestrator()
 
 print("\nTesting search with simple query...")
-result = orch.search("What is Python?", use_cache=False)
+result = asyncio.run(orch.search("What is Python?", use_cache=False))
 
 print("\n" + "="*60)
 print("RESULT:")